@@ -1,42 +1,54 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file
+from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, current_app, jsonify, make_response
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_migrate import Migrate
 import click
 from flask.cli import with_appcontext
-import pandas as pd
+from werkzeug.http import is_resource_modified
 import os
-from datetime import datetime
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
 from io import BytesIO
 
+from metricas_pool import engine_options, instrumentar, snapshot as snapshot_metricas
+from fila_historico import FilaHistorico
+import snapshot_parquet
 
+# pandas/openpyxl são importados dentro das rotas que os usam (cadastro_cartoes e
+# historico_export): o import custa centenas de ms e dezenas de MB por worker e
+# não deve pesar no boot do gunicorn nem no "flask db upgrade" do release.
 
-app = Flask(__name__)
-app.secret_key = 'supersecretkey'
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+db = SQLAlchemy()
+migrate = Migrate()
+login_manager = LoginManager()
+
+# Rotas são registradas no app dentro de create_app(); o decorator apenas as
+# anota para manter os endpoints com os mesmos nomes usados nos templates.
+_rotas = []
 
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace(
-        "postgres://",
-        "postgresql://",
-        1
-    )
 
-app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+def rota(rule, **options):
+    def decorator(view):
+        _rotas.append((rule, view, options))
+        return view
+    return decorator
 
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_pre_ping": True,
-    "pool_recycle": 300,
-    "pool_size": 5,
-    "max_overflow": 10
-}
 
-db = SQLAlchemy(app)
+def database_url():
+    url = os.getenv("DATABASE_URL")
 
-migrate = Migrate(app, db)
+    if url and url.startswith("postgres://"):
+        url = url.replace(
+            "postgres://",
+            "postgresql://",
+            1
+        )
+
+    return url
 
 
 # ---------------- Models ----------------
@@ -74,10 +86,21 @@ class HistoricoInventario(db.Model):
     mes = db.Column(db.String(20))
     inventario_id = db.Column(db.Integer)
     planta = db.Column(db.String(50))
+    # Preenchido quando a linha é alterada depois de gravada (ver gravar_historico_lote);
+    # o export-parquet regrava as partições com linhas alteradas
+    alterado_em = db.Column(db.DateTime, index=True)
+
+class VersaoCache(db.Model):
+    # Versão por (planta, mes); mes='*' cobre alterações que afetam todos os meses
+    __tablename__ = 'versao_cache'
+    planta = db.Column(db.String(50), primary_key=True)
+    mes = db.Column(db.String(20), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False)
 
 # ---------------- Inicialização do banco ----------------
 
-@app.cli.command("seed-admin")
+@click.command("seed-admin")
 @with_appcontext
 def seed_admin():
     if not Usuario.query.filter_by(nome='admin', planta='1412').first():
@@ -97,11 +120,223 @@ def seed_admin():
 
 
 
-# ---------------- Login manager ----------------
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+@click.command("export-parquet")
+@click.option("--intervalo", type=int, default=0,
+              help="Repete a exportação a cada N segundos (modo agendado).")
+@with_appcontext
+def export_parquet(intervalo):
+    base = current_app.config['PARQUET_DIR']
+
+    def exportar():
+        total = snapshot_parquet.exportar_incremental(db.session, HistoricoInventario, base)
+        db.session.remove()
+        print(f"{total} linha(s) exportada(s) para {base} (marca d'água: {snapshot_parquet.ler_watermark(base)[0]}).")
+
+    if intervalo > 0:
+        snapshot_parquet.exportar_periodicamente(exportar, intervalo)
+    else:
+        exportar()
+
+
+# ---------------- Cache HTTP (ETag / Last-Modified) ----------------
+# Cada escrita que altera o dashboard/histórico incrementa a versão do
+# (planta, mes) afetado, na mesma transação ou, nas leituras de cartão, logo
+# após o commit (ver invalidar_cache_apos_commit). As páginas derivam o ETag dessas
+# versões: uma visita repetida sem alterações recebe 304 sem consultar o
+# histórico nem renderizar o template.
+
+TODOS_MESES = '*'
+CACHE_MESES_FECHADOS_TTL = 24 * 60 * 60
+CACHE_MESES_FECHADOS_MAX = 256
+
+_cache_meses_fechados = {}
+_cache_lock = threading.Lock()
+
+
+def upsert_versao_cache(dialeto, planta, mes=TODOS_MESES):
+    """INSERT ... ON CONFLICT que incrementa a versão, ou None se o dialeto não suporta."""
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    stmt = insert(VersaoCache).values(planta=planta or '', mes=mes, versao=1, atualizado_em=agora)
+    return stmt.on_conflict_do_update(
+        index_elements=['planta', 'mes'],
+        set_={'versao': VersaoCache.versao + 1, 'atualizado_em': agora}
+    )
+
+
+def invalidar_cache(planta, mes=TODOS_MESES):
+    """Incrementa a versão de (planta, mes) na transação corrente."""
+    stmt = upsert_versao_cache(db.session.get_bind().dialect.name, planta, mes)
+    if stmt is not None:
+        db.session.execute(stmt)
+        return
 
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    versao = db.session.get(VersaoCache, (planta or '', mes))
+    if versao:
+        versao.versao += 1
+        versao.atualizado_em = agora
+    else:
+        db.session.add(VersaoCache(planta=planta or '', mes=mes, versao=1, atualizado_em=agora))
+
+
+def invalidar_cache_apos_commit(planta, mes=TODOS_MESES):
+    """Incrementa a versão em uma transação própria, depois do commit dos dados.
+
+    Usada pelas leituras de cartão: a linha (planta, mes) de versao_cache é a
+    mesma para todas as leituras simultâneas, e dentro da transação da leitura
+    ficaria bloqueada até o commit, enfileirando as leituras. Se o processo cair
+    entre os dois commits, a versão só avança na próxima alteração.
+    """
+    invalidar_cache(planta, mes)
+    db.session.commit()
+
+
+def versao_atual(*filtros):
+    """Soma das versões (cresce a cada alteração) e data da última alteração."""
+    soma, ultima = db.session.query(
+        db.func.coalesce(db.func.sum(VersaoCache.versao), 0),
+        db.func.max(VersaoCache.atualizado_em)
+    ).filter(*filtros).one()
+    return int(soma), ultima
+
+
+def versoes_planta(planta):
+    """Versões da planta por mês: {mes: (versao, atualizado_em)}."""
+    return {
+        mes: (versao, atualizado_em)
+        for mes, versao, atualizado_em in db.session.query(
+            VersaoCache.mes, VersaoCache.versao, VersaoCache.atualizado_em
+        ).filter(VersaoCache.planta == (planta or ''))
+    }
+
+
+def mes_fechado(mes):
+    return bool(mes) and mes < datetime.now().strftime('%Y-%m')
+
+
+def cache_mes_fechado(chave, gerar):
+    """Cache em memória (por worker) para dados de meses já encerrados e para a
+    lista de meses, que só mudam junto com a versão.
+
+    A chave inclui a versão, então uma alteração tardia gera uma nova entrada
+    em vez de servir dados antigos.
+    """
+    agora = time.monotonic()
+    with _cache_lock:
+        item = _cache_meses_fechados.get(chave)
+        if item and item[0] > agora:
+            return item[1]
+
+    dados = gerar()
+    with _cache_lock:
+        if len(_cache_meses_fechados) >= CACHE_MESES_FECHADOS_MAX:
+            _cache_meses_fechados.pop(next(iter(_cache_meses_fechados)))
+        _cache_meses_fechados[chave] = (agora + CACHE_MESES_FECHADOS_TTL, dados)
+    return dados
+
+
+def resposta_condicional(partes, ultima_alteracao, gerar):
+    """Responde 304 se o cliente já tem a versão atual; senão renderiza via gerar()."""
+    # Mensagens flash pendentes são consumidas pela página: não podem ir para o cache
+    if session.get('_flashes'):
+        resp = make_response(gerar())
+        resp.headers['Cache-Control'] = 'no-store'
+        return resp
+
+    # A navbar mostra usuário, nível e planta: eles também fazem parte do ETag
+    partes = (current_user.id, current_user.nome, current_user.nivel, session.get('planta')) + tuple(partes)
+    etag = hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+    if ultima_alteracao is not None:
+        ultima_alteracao = ultima_alteracao.replace(tzinfo=timezone.utc, microsecond=0)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima_alteracao):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = make_response(gerar())
+
+    resp.set_etag(etag)
+    if ultima_alteracao is not None:
+        resp.last_modified = ultima_alteracao
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+# ---------------- Histórico write-behind ----------------
+def fila_historico():
+    """Fila local do histórico, ou None se HISTORICO_WRITE_BEHIND estiver desligado."""
+    return current_app.extensions.get('fila_historico')
+
+
+def chave_fila_historico(cartao_id, inventario_id):
+    return f'{cartao_id}:{inventario_id}'
+
+
+def gravar_historico_lote(linhas):
+    """Insere um lote vindo da fila com um INSERT multi-linha.
+
+    Idempotente: ignora (cartao_id, inventario_id) já gravados, como faz a ação
+    registrar, e linhas de cartões excluídos nesse meio tempo. A exceção é uma
+    leitura OK anterior a um "Não encontrado" gravado pelo finalizar (a leitura
+    estava na fila de outra máquina): ela substitui o "Não encontrado".
+
+    A linha da fila é a fonte da leitura: ela é enfileirada antes do commit do
+    cartão, então o lote também aplica a leitura ao cartão (sem efeito se o
+    commit da requisição já o fez; recupera a leitura se o processo caiu antes).
+    """
+    pares = {(l['cartao_id'], l['inventario_id']) for l in linhas}
+    existentes = {
+        (h.cartao_id, h.inventario_id): h
+        for h in HistoricoInventario.query.filter(
+            db.tuple_(HistoricoInventario.cartao_id, HistoricoInventario.inventario_id).in_(pares)
+        )
+    }
+    cartoes = {c.id: c for c in Cartao.query.filter(Cartao.id.in_({l['cartao_id'] for l in linhas}))}
+
+    novas = []
+    alterados = set()
+    for l in linhas:
+        par = (l['cartao_id'], l['inventario_id'])
+        cartao = cartoes.get(l['cartao_id'])
+        if not cartao:
+            continue
+
+        existente = existentes.get(par)
+        if existente is None:
+            existentes[par] = l
+            novas.append(l)
+            if l['status'] == 'OK' and (cartao.ultimo_inventario or '') < l['data']:
+                cartao.status = 'OK'
+                cartao.ultimo_inventario = l['data']
+                cartao.usuario_inventario = l['usuario']
+        elif (isinstance(existente, HistoricoInventario)
+              and existente.status == 'Não encontrado' and l['status'] == 'OK'
+              and (l['data'] or '') < (existente.data or '')):
+            # O cartão só volta a OK se o finalizar foi a última alteração dele
+            if cartao.status == 'Não encontrado' and cartao.ultimo_inventario == existente.data:
+                cartao.status = 'OK'
+                cartao.ultimo_inventario = l['data']
+                cartao.usuario_inventario = l['usuario']
+            existente.status = 'OK'
+            existente.usuario = l['usuario']
+            existente.data = l['data']
+            existente.alterado_em = datetime.now(timezone.utc).replace(tzinfo=None)
+            alterados.add((existente.planta, existente.mes))
+
+    if novas:
+        db.session.execute(db.insert(HistoricoInventario), novas)
+    for planta, mes in {(l['planta'], l['mes']) for l in novas} | alterados:
+        invalidar_cache(planta, mes)
+    db.session.commit()
+
+
+# ---------------- Login manager ----------------
 @login_manager.user_loader
 def load_user(user_id):
     # Com SQLAlchemy, basta buscar pelo ID usando o model Usuario
@@ -109,7 +344,7 @@ def load_user(user_id):
 
 # ---------------- Rotas ----------------
 # ---------------- Auth routes ----------------
-@app.route('/login', methods=['GET', 'POST'])
+@rota('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         nome = request.form.get('nome', '').strip()
@@ -158,7 +393,7 @@ def login():
     return render_template('login.html')
 
 
-@app.route('/logout')
+@rota('/logout')
 @login_required
 def logout():
     logout_user()  # encerra a sessão do Flask-Login
@@ -168,7 +403,7 @@ def logout():
 
 
 # ---------------- Dashboard ----------------
-@app.route('/', methods=['GET'])
+@rota('/', methods=['GET'])
 @login_required
 def dashboard():
     mes = request.args.get('mes') or datetime.now().strftime('%Y-%m')
@@ -186,24 +421,37 @@ def dashboard():
 
         return ok, nao
 
-    ok1412, nao1412 = get_counts('1412')
-    ok1420, nao1420 = get_counts('1420')
+    def consultar():
+        ok1412, nao1412 = get_counts('1412')
+        ok1420, nao1420 = get_counts('1420')
 
-    inv_qtd = Inventario.query.filter(
-        Inventario.data_fim != None,
-        Inventario.data_fim.like(f"{mes}%")
-    ).count()
+        inv_qtd = Inventario.query.filter(
+            Inventario.data_fim != None,
+            Inventario.data_fim.like(f"{mes}%")
+        ).count()
 
-    return render_template(
-        'dashboard.html',
-        mes=mes,
-        dados={'1412': {'ok': ok1412, 'nao': nao1412}, '1420': {'ok': ok1420, 'nao': nao1420}},
-        inv_qtd=inv_qtd
-        )
+        return {'1412': {'ok': ok1412, 'nao': nao1412}, '1420': {'ok': ok1420, 'nao': nao1420}}, inv_qtd
+
+    versao, ultima = versao_atual(VersaoCache.mes.in_([mes, TODOS_MESES]))
+
+    def gerar():
+        if mes_fechado(mes):
+            dados, inv_qtd = cache_mes_fechado(('dashboard', mes, versao), consultar)
+        else:
+            dados, inv_qtd = consultar()
+
+        return render_template(
+            'dashboard.html',
+            mes=mes,
+            dados=dados,
+            inv_qtd=inv_qtd
+            )
+
+    return resposta_condicional(('dashboard', mes, versao), ultima, gerar)
 
 
 # ---------------- Inventário ----------------
-@app.route('/inventario', methods=['GET', 'POST'])
+@rota('/inventario', methods=['GET', 'POST'])
 @login_required
 def inventario():
     inventario_ativo = Inventario.query.filter_by(status="Ativo").first()
@@ -243,14 +491,18 @@ def inventario():
                 flash('Cartão não encontrado na base!')
                 return redirect(url_for('inventario'))
 
-            existe = HistoricoInventario.query.filter_by(cartao_id=cartao.id, inventario_id=inventario_ativo.id).first()
+            fila = fila_historico()
+            chave = chave_fila_historico(cartao.id, inventario_ativo.id)
+            existe = (HistoricoInventario.query.filter_by(cartao_id=cartao.id, inventario_id=inventario_ativo.id).first()
+                      or (fila and fila.contem(chave)))
 
             cartao.status = "OK"
             cartao.ultimo_inventario = agora
             cartao.usuario_inventario = current_user.nome
 
+            hist = None
             if not existe:
-                hist = HistoricoInventario(
+                hist = dict(
                     cartao_id=cartao.id,
                     numero=cartao.numero,
                     status="OK",
@@ -260,9 +512,17 @@ def inventario():
                     inventario_id=inventario_ativo.id,
                     planta=planta
                 )
-                db.session.add(hist)
+                if fila:
+                    # Write-behind: a leitura vai para a fila (em disco) antes do commit
+                    # do cartão; o lote grava o histórico, aplica a leitura ao cartão e
+                    # incrementa a versão do cache (ver gravar_historico_lote)
+                    fila.enfileirar(hist, chave=chave)
+                else:
+                    db.session.add(HistoricoInventario(**hist))
 
             db.session.commit()
+            if hist and not fila:
+                invalidar_cache_apos_commit(planta, mes_atual)
             flash(f'Cartão {numero} inventariado com sucesso!')
             return redirect(url_for('inventario'))
 
@@ -272,6 +532,11 @@ def inventario():
                 flash('Não há inventário ativo para finalizar.')
                 return redirect(url_for('inventario'))
 
+            # As leituras ainda na fila precisam estar no banco antes de calcular os faltantes
+            fila = fila_historico()
+            if fila:
+                fila.drenar()
+
             inventario_id = inventario_ativo.id
             faltantes = Cartao.query.filter_by(planta=planta).filter(
                 ~Cartao.id.in_([h.cartao_id for h in HistoricoInventario.query.filter_by(inventario_id=inventario_id)])
@@ -297,6 +562,7 @@ def inventario():
             inventario_ativo.status = "Finalizado"
             inventario_ativo.data_fim = agora
             db.session.commit()
+            invalidar_cache_apos_commit(planta, mes_atual)
 
             flash(f'Inventário finalizado! {len(faltantes)} cartão(ões) marcado(s) como "Não encontrado".')
             return redirect(url_for('dashboard'))
@@ -311,7 +577,7 @@ def inventario():
     return render_template('inventario.html', inventario_ativo=inventario_ativo, cartoes=cartoes)
 
 # ---------------- Cadastro de Cartões ----------------
-@app.route('/cadastro-cartoes', methods=['GET', 'POST'])
+@rota('/cadastro-cartoes', methods=['GET', 'POST'])
 @login_required
 def cadastro_cartoes():
     if request.method == 'POST':
@@ -320,9 +586,11 @@ def cadastro_cartoes():
         # Upload de arquivo
         if 'file' in request.files and request.files['file'].filename != '':
             file = request.files['file']
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], file.filename)
             file.save(filepath)
             try:
+                import pandas as pd
+
                 if file.filename.lower().endswith('.csv'):
                     df = pd.read_csv(filepath)
                 else:
@@ -368,11 +636,17 @@ def cadastro_cartoes():
                 cartao = Cartao.query.get(id_cartao)
                 
                 if cartao:
+                    # 0. Leituras pendentes na fila vão para o banco antes de apagar o histórico
+                    fila = fila_historico()
+                    if fila:
+                        fila.drenar()
+
                     # 1. Primeiro, deletamos todo o histórico associado a este cartão
                     HistoricoInventario.query.filter_by(cartao_id=cartao.id).delete()
                     
                     # 2. Agora o cartão está livre para ser deletado
                     db.session.delete(cartao)
+                    invalidar_cache(cartao.planta)
                     db.session.commit()
                     flash('Cartão e seu histórico foram excluídos com sucesso!')
                 else:
@@ -385,28 +659,61 @@ def cadastro_cartoes():
     return render_template('cadastro_cartoes.html', cartoes=cartoes)
 
 # ---------------- Histórico ----------------
-@app.route('/historico', methods=['GET'])
+@rota('/historico', methods=['GET'])
 @login_required
 def historico():
     mes = request.args.get('mes')
     planta = session.get('planta')
 
-    # Consulta com ORM
-    query = HistoricoInventario.query.filter_by(planta=planta)
+    def consultar():
+        # Consulta com ORM
+        query = HistoricoInventario.query.filter_by(planta=planta)
+        if mes:
+            query = query.filter(HistoricoInventario.mes == mes)
+
+        return query.order_by(HistoricoInventario.data.desc()).all()
+
+    def consultar_meses():
+        # Meses disponíveis (distinct)
+        meses_disponiveis = db.session.query(HistoricoInventario.mes).filter_by(planta=planta).distinct().order_by(HistoricoInventario.mes.desc()).all()
+        return [m[0] for m in meses_disponiveis]
+
+    versoes = versoes_planta(planta)
+    geral = versoes.get(TODOS_MESES, (0, None))
+
+    # Um mês filtrado só muda com (planta, mes) ou (planta, '*'); sem filtro a
+    # página inclui todos os meses da planta
     if mes:
-        query = query.filter(HistoricoInventario.mes == mes)
+        versao = (versoes.get(mes, (0, None))[0], geral[0])
+        datas = [versoes.get(mes, (0, None))[1], geral[1]]
+    else:
+        versao = sum(v for v, _ in versoes.values())
+        datas = [a for _, a in versoes.values()]
+    ultima = max((d for d in datas if d), default=None)
 
-    historico_rows = query.order_by(HistoricoInventario.data.desc()).all()
+    # A lista de meses só muda quando surge um mês novo (nova linha de versão)
+    # ou com uma alteração em todos os meses
+    versao_meses = (len(versoes), geral[0])
 
-    # Meses disponíveis (distinct)
-    meses_disponiveis = db.session.query(HistoricoInventario.mes).filter_by(planta=planta).distinct().order_by(HistoricoInventario.mes.desc()).all()
-    meses_lista = [m[0] for m in meses_disponiveis]
+    def gerar():
+        meses_lista = cache_mes_fechado(('meses', planta, versao_meses), consultar_meses)
+
+        if mes_fechado(mes):
+            def consultar_dicts():
+                colunas = ('data', 'numero', 'status', 'usuario', 'inventario_id', 'planta')
+                return [{c: getattr(h, c) for c in colunas} for h in consultar()]
+
+            historico_rows = cache_mes_fechado(('historico', planta, mes, versao), consultar_dicts)
+        else:
+            historico_rows = consultar()
 
-    return render_template('historico.html', historico=historico_rows, mes=mes, meses_disponiveis=meses_lista)
+        return render_template('historico.html', historico=historico_rows, mes=mes, meses_disponiveis=meses_lista)
+
+    return resposta_condicional(('historico', mes, versao, versao_meses), ultima, gerar)
 
 
 # ---------------- Histórico Export ----------------
-@app.route('/historico/export', methods=['GET'])
+@rota('/historico/export', methods=['GET'])
 @login_required
 def historico_export():
     mes = request.args.get('mes')
@@ -421,6 +728,8 @@ def historico_export():
     historico_rows = query.order_by(HistoricoInventario.data.desc()).all()
 
     # Converter para DataFrame
+    import pandas as pd
+
     data = [
         {
             'id': row.id,
@@ -456,8 +765,23 @@ def historico_export():
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+# ---------------- Histórico Analytics (Parquet) ----------------
+@rota('/historico/analytics', methods=['GET'])
+@login_required
+def historico_analytics():
+    # Lê o snapshot gerado por "flask export-parquet", sem consultar o banco
+    mes = request.args.get('mes')
+    planta = request.args.get('planta')
+
+    df = snapshot_parquet.carregar(current_app.config['PARQUET_DIR'], planta=planta, mes=mes)
+    return jsonify({
+        'watermark': snapshot_parquet.ler_watermark(current_app.config['PARQUET_DIR'])[0],
+        'dados': snapshot_parquet.agregados(df)
+    })
+
+
 # ---------------- Gestão de Usuários ----------------
-@app.route('/gestao-usuarios', methods=['GET', 'POST'])
+@rota('/gestao-usuarios', methods=['GET', 'POST'])
 @login_required
 def gestao_usuarios():
     if current_user.nivel != 'Admin':
@@ -548,7 +872,7 @@ def gestao_usuarios():
 
 
 # ---------------- Alterar Senha (usuário) ----------------
-@app.route('/alterar-senha', methods=['GET', 'POST'])
+@rota('/alterar-senha', methods=['GET', 'POST'])
 @login_required
 def alterar_senha():
     if request.method == 'POST':
@@ -591,5 +915,71 @@ def alterar_senha():
 
     return render_template('alterar_senha.html')
 
+# ---------------- Métricas do pool (por worker) ----------------
+@rota('/metricas/pool', methods=['GET'])
+@login_required
+def metricas_pool():
+    if current_user.nivel != 'Admin':
+        flash('Acesso negado! Somente Admin pode consultar métricas.')
+        return redirect(url_for('dashboard'))
+
+    dados = snapshot_metricas()
+    dados['sync']['status'] = db.engine.pool.status()
+    dados['sync']['config'] = {k: str(v) for k, v in current_app.config["SQLALCHEMY_ENGINE_OPTIONS"].items()}
+
+    # Engine da API assíncrona, quando o app roda sob api_async
+    engine_async = current_app.extensions.get('engine_async')
+    if engine_async is not None:
+        dados['async']['status'] = engine_async.pool.status()
+    return jsonify(dados)
+
+
+# ---------------- App factory ----------------
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = 'supersecretkey'
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["PARQUET_DIR"] = os.getenv("PARQUET_DIR", os.path.join(app.instance_path, "parquet"))
+
+    # Tamanho do pool, pre-ping e modo PgBouncer vêm do ambiente (ver metricas_pool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options()
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+
+    with app.app_context():
+        instrumentar(db.engine, 'sync')
+
+    login_manager.init_app(app)
+    login_manager.login_view = 'login'
+
+    app.cli.add_command(seed_admin)
+    app.cli.add_command(export_parquet)
+
+    for rule, view, options in _rotas:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    # Histórico write-behind (ver fila_historico)
+    if os.getenv("HISTORICO_WRITE_BEHIND", "0").strip().lower() in ('1', 'true', 'yes', 'on', 'sim'):
+        def gravar(linhas):
+            with app.app_context():
+                gravar_historico_lote(linhas)
+
+        fila = FilaHistorico(
+            os.getenv("HISTORICO_FILA", os.path.join(app.instance_path, "fila_historico.sqlite3")),
+            gravar,
+            lote=int(os.getenv("HISTORICO_FLUSH_LOTE", "500")),
+            intervalo=float(os.getenv("HISTORICO_FLUSH_INTERVALO", "1"))
+        )
+        # A recuperação do que ficou na fila fica a cargo da thread de descarga,
+        # iniciada pelo servidor (ver gunicorn.conf.py), e não da factory, que
+        # também roda em todo comando flask
+        app.extensions['fila_historico'] = fila
+
+    return app
+
+
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
@@ -0,0 +1,277 @@
+"""API assíncrona de leitura de cartões e progresso do inventário (ASGI).
+
+O app ASGI atende /api/* com SQLAlchemy assíncrono (asyncpg) usando os mesmos
+models de Inventario.py; qualquer outra rota é repassada ao app Flask via
+WsgiToAsgi. Assim um único processo uvicorn atende centenas de coletores
+simultâneos, cada um aguardando o banco sem ocupar um worker.
+
+A autenticação reaproveita o cookie de sessão do Flask (login feito em /login).
+
+    POST /api/registrar            {"numero": "..."} -> registra a leitura
+    GET  /api/inventario/status    progresso do inventário ativo na planta
+
+Execução (ver Procfile):
+
+    gunicorn -k uvicorn_worker.UvicornWorker "api_async:create_asgi_app()"
+"""
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import Inventario as inv
+from metricas_pool import engine_options, instrumentar
+
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+
+def async_database_url(url):
+    """Troca o driver síncrono da URL pelo equivalente assíncrono."""
+    if url.startswith('postgresql+psycopg2://'):
+        return 'postgresql+asyncpg://' + url[len('postgresql+psycopg2://'):]
+    if url.startswith('postgresql://'):
+        return 'postgresql+asyncpg://' + url[len('postgresql://'):]
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+
+def nome_prepared_statement():
+    return f'__asyncpg_{uuid4()}__'
+
+
+def async_engine_options(url):
+    # Pool próprio (DB_ASYNC_*), somado ao pool síncrono que o worker também tem
+    opcoes = engine_options('DB_ASYNC', pool_size='5', max_overflow='5')
+    if opcoes.get('poolclass') is NullPool:
+        if url.startswith('postgresql+asyncpg://'):
+            # PgBouncer em modo transaction: cada transação pode cair em outro
+            # backend. Sem cache de statements (asyncpg e SQLAlchemy) e com nomes
+            # únicos, um prepared statement não colide com o de outra conexão
+            # (__asyncpg_stmt_N__ se repete entre conexões).
+            opcoes['connect_args'] = {
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'prepared_statement_name_func': nome_prepared_statement,
+            }
+    return opcoes
+
+
+class ErroApi(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+class ApiAsync:
+    """App ASGI: /api/* assíncrono, demais rotas delegadas ao Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.engine = None
+        self.sessao = None
+        self.rotas = {
+            ('POST', '/api/registrar'): self.registrar,
+            ('GET', '/api/inventario/status'): self.status,
+        }
+
+    # ---------------- ASGI ----------------
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'].startswith('/api/'):
+            await self.api(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                # Criado já dentro do worker (após o fork e no event loop dele)
+                url = async_database_url(self.flask_app.config['SQLALCHEMY_DATABASE_URI'])
+                self.engine = create_async_engine(url, **async_engine_options(url))
+                instrumentar(self.engine, 'async')
+                self.flask_app.extensions['engine_async'] = self.engine.sync_engine
+                self.sessao = async_sessionmaker(self.engine, expire_on_commit=False)
+                fila = self.flask_app.extensions.get('fila_historico')
+                if fila:
+                    fila.iniciar()
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def api(self, scope, receive, send):
+        handler = self.rotas.get((scope['method'], scope['path']))
+        try:
+            if handler is None:
+                raise ErroApi(404, 'Rota não encontrada.')
+            sessao_flask = self.sessao_flask(scope)
+            if not sessao_flask.get('_user_id'):
+                raise ErroApi(401, 'Faça login para usar a API.')
+            corpo = await self.ler_json(receive) if scope['method'] == 'POST' else {}
+            status, dados = 200, await handler(sessao_flask, corpo)
+        except ErroApi as e:
+            status, dados = e.status, {'ok': False, 'mensagem': e.mensagem}
+
+        conteudo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json; charset=utf-8'),
+                (b'content-length', str(len(conteudo)).encode('ascii')),
+                (b'cache-control', b'no-store'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': conteudo})
+
+    def sessao_flask(self, scope):
+        cabecalhos = dict(scope['headers'])
+        cookie = SimpleCookie(cabecalhos.get(b'cookie', b'').decode('latin-1'))
+        nome = self.flask_app.config['SESSION_COOKIE_NAME']
+        if nome not in cookie:
+            return {}
+        try:
+            max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+            return self.serializer.loads(cookie[nome].value, max_age=max_age)
+        except BadSignature:
+            return {}
+
+    async def ler_json(self, receive):
+        corpo = b''
+        while True:
+            mensagem = await receive()
+            corpo += mensagem.get('body', b'')
+            if len(corpo) > TAMANHO_MAXIMO_CORPO:
+                raise ErroApi(413, 'Requisição muito grande.')
+            if not mensagem.get('more_body'):
+                break
+        try:
+            dados = json.loads(corpo or b'{}')
+        except ValueError:
+            raise ErroApi(400, 'JSON inválido.')
+        if not isinstance(dados, dict):
+            raise ErroApi(400, 'JSON inválido.')
+        return dados
+
+    # ---------------- Rotas ----------------
+    async def registrar(self, sessao_flask, corpo):
+        # Mesmas regras da ação "registrar" de /inventario
+        numero = str(corpo.get('numero') or '').strip()
+        planta = sessao_flask.get('planta')
+        agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        mes_atual = datetime.now().strftime('%Y-%m')
+
+        async with self.sessao() as s, s.begin():
+            usuario = await s.get(inv.Usuario, int(sessao_flask['_user_id']))
+            if not usuario:
+                raise ErroApi(401, 'Usuário não encontrado.')
+
+            inventario_ativo = (await s.execute(
+                select(inv.Inventario).filter_by(status="Ativo").limit(1)
+            )).scalar_one_or_none()
+            if not inventario_ativo:
+                raise ErroApi(409, 'Inicie o inventário antes de registrar.')
+            if not numero:
+                raise ErroApi(400, 'Informe o número do cartão.')
+
+            # FOR UPDATE serializa leituras simultâneas do mesmo cartão, para que
+            # duas requisições não gravem o histórico em duplicidade
+            cartao = (await s.execute(
+                select(inv.Cartao).filter_by(numero=numero, planta=planta).limit(1).with_for_update()
+            )).scalar_one_or_none()
+            if not cartao:
+                raise ErroApi(404, 'Cartão não encontrado na base!')
+
+            fila = self.flask_app.extensions.get('fila_historico')
+            chave = inv.chave_fila_historico(cartao.id, inventario_ativo.id)
+            existe = (await s.execute(
+                select(inv.HistoricoInventario.id)
+                .filter_by(cartao_id=cartao.id, inventario_id=inventario_ativo.id)
+                .limit(1)
+            )).first()
+            if not existe and fila:
+                existe = await asyncio.to_thread(fila.contem, chave)
+
+            cartao.status = "OK"
+            cartao.ultimo_inventario = agora
+            cartao.usuario_inventario = usuario.nome
+
+            hist = None
+            if not existe:
+                hist = dict(
+                    cartao_id=cartao.id,
+                    numero=cartao.numero,
+                    status="OK",
+                    usuario=usuario.nome,
+                    data=agora,
+                    mes=mes_atual,
+                    inventario_id=inventario_ativo.id,
+                    planta=planta
+                )
+                if fila:
+                    # Write-behind: enfileira (fsync, fora do event loop) antes do
+                    # commit do cartão (ver Inventario.gravar_historico_lote)
+                    await asyncio.to_thread(fila.enfileirar, hist, chave)
+                else:
+                    s.add(inv.HistoricoInventario(**hist))
+
+        # A versão do cache é incrementada em uma transação curta, depois do
+        # commit: a linha (planta, mes) é disputada por todas as leituras
+        # (ver Inventario.invalidar_cache_apos_commit)
+        if hist and not fila:
+            stmt = inv.upsert_versao_cache(self.engine.dialect.name, planta, mes_atual)
+            if stmt is not None:
+                async with self.sessao() as s, s.begin():
+                    await s.execute(stmt)
+
+        return {
+            'ok': True,
+            'mensagem': f'Cartão {numero} inventariado com sucesso!',
+            'cartao': {'id': cartao.id, 'numero': cartao.numero, 'status': cartao.status},
+            'repetido': bool(existe),
+        }
+
+    async def status(self, sessao_flask, corpo):
+        planta = sessao_flask.get('planta')
+
+        async with self.sessao() as s:
+            inventario_ativo = (await s.execute(
+                select(inv.Inventario).filter_by(status="Ativo").limit(1)
+            )).scalar_one_or_none()
+
+            por_status = dict((await s.execute(
+                select(inv.Cartao.status, func.count())
+                .filter_by(planta=planta)
+                .group_by(inv.Cartao.status)
+            )).all())
+
+        return {
+            'planta': planta,
+            'inventario_ativo': {
+                'id': inventario_ativo.id,
+                'data_inicio': inventario_ativo.data_inicio,
+            } if inventario_ativo else None,
+            'total': sum(por_status.values()),
+            'ok': por_status.get('OK', 0),
+            'pendentes': por_status.get('Em inventário', 0),
+            'por_status': {str(k): v for k, v in por_status.items()},
+        }
+
+
+def create_asgi_app():
+    return ApiAsync(inv.create_app())
@@ -0,0 +1,164 @@
+"""Fila local durável (write-behind) para as linhas de historico_inventario.
+
+Com HISTORICO_WRITE_BEHIND=1 a leitura de um cartão grava a linha de histórico
+em um arquivo SQLite local (WAL, synchronous=FULL) em vez de inseri-la no banco
+principal dentro da requisição. Uma thread por processo descarrega a fila em
+lotes a cada HISTORICO_FLUSH_INTERVALO segundos (padrão 1), com até
+HISTORICO_FLUSH_LOTE linhas (padrão 500) por INSERT multi-linha.
+
+Variáveis de ambiente:
+
+    HISTORICO_WRITE_BEHIND (0)     ativa o modo write-behind
+    HISTORICO_FILA                 arquivo da fila (padrão: instance/fila_historico.sqlite3)
+    HISTORICO_FLUSH_LOTE (500)     linhas por lote
+    HISTORICO_FLUSH_INTERVALO (1)  segundos entre descargas
+
+Uma linha só sai da fila depois que o lote foi confirmado no banco principal;
+se o processo cair no meio, o lote é regravado na próxima descarga. Por isso a
+função de gravação deve ser idempotente.
+
+A thread de descarga começa descarregando o que ficou de uma execução anterior.
+Ela é iniciada por iniciar() na subida do processo servidor (post_worker_init
+do gunicorn, lifespan do app ASGI) ou na primeira leitura enfileirada; comandos
+`flask` (ex.: db upgrade no release) não tocam na fila.
+
+Todos os workers de uma máquina compartilham o mesmo arquivo; um lock de
+arquivo garante que apenas um deles descarrega por vez. Máquinas diferentes
+precisam de arquivos (e discos) próprios.
+
+HISTORICO_FILA precisa ficar em um disco local persistente: em um sistema de
+arquivos efêmero (ex.: dynos do Heroku) a fila é perdida quando a máquina
+reinicia, e as leituras ainda não descarregadas com ela.
+
+Como finalizar só descarrega a fila da própria máquina, uma leitura ainda na
+fila de outra máquina pode chegar depois de o cartão ter sido marcado como
+"Não encontrado"; a função de gravação corrige essa linha (ver
+Inventario.gravar_historico_lote).
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: exclusão apenas entre threads do mesmo processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FilaHistorico:
+    def __init__(self, caminho, gravar, lote=500, intervalo=1.0):
+        self.caminho = caminho
+        self.gravar = gravar
+        self.lote = lote
+        self.intervalo = intervalo
+        self._local = threading.local()
+        self._lock_drenagem = threading.Lock()
+        self._pid_thread = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._conexao().execute(
+            'CREATE TABLE IF NOT EXISTS fila (seq INTEGER PRIMARY KEY AUTOINCREMENT, chave TEXT, dados TEXT NOT NULL)'
+        )
+        colunas = {c[1] for c in self._conexao().execute('PRAGMA table_info(fila)')}
+        if 'chave' not in colunas:  # fila criada por uma versão anterior
+            self._conexao().execute('ALTER TABLE fila ADD COLUMN chave TEXT')
+        self._conexao().execute('CREATE INDEX IF NOT EXISTS fila_chave ON fila (chave)')
+
+    def _conexao(self):
+        # Uma conexão por thread; após um fork a conexão herdada não é reutilizada
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enfileirar(self, linha, chave=None):
+        """Grava a linha na fila; ao retornar ela já está em disco."""
+        self._conexao().execute('INSERT INTO fila (chave, dados) VALUES (?, ?)', (chave, json.dumps(linha)))
+        self.iniciar()
+
+    def contem(self, chave):
+        """Indica se há uma linha pendente com a `chave` informada."""
+        return self._conexao().execute('SELECT 1 FROM fila WHERE chave = ? LIMIT 1', (chave,)).fetchone() is not None
+
+    def pendentes(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM fila').fetchone()[0]
+
+    @contextmanager
+    def _exclusivo(self, bloquear):
+        if not self._lock_drenagem.acquire(blocking=bloquear):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            with open(self.caminho + '.lock', 'a') as arquivo:
+                try:
+                    fcntl.flock(arquivo, fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(arquivo, fcntl.LOCK_UN)
+        finally:
+            self._lock_drenagem.release()
+
+    def drenar(self, bloquear=True):
+        """Descarrega a fila no banco principal. Retorna o total de linhas gravadas.
+
+        Com bloquear=False retorna 0 se outro processo já estiver descarregando.
+        """
+        total = 0
+        with self._exclusivo(bloquear) as exclusivo:
+            if not exclusivo:
+                return 0
+
+            conn = self._conexao()
+            while True:
+                linhas = conn.execute(
+                    'SELECT seq, dados FROM fila ORDER BY seq LIMIT ?', (self.lote,)
+                ).fetchall()
+                if not linhas:
+                    break
+
+                self.gravar([json.loads(dados) for _, dados in linhas])
+                conn.execute('DELETE FROM fila WHERE seq <= ?', (linhas[-1][0],))
+                total += len(linhas)
+
+                if len(linhas) < self.lote:
+                    break
+        return total
+
+    def iniciar(self):
+        """Inicia a thread de descarga deste processo (uma vez por pid)."""
+        if self._pid_thread == os.getpid():
+            return
+        self._pid_thread = os.getpid()
+        threading.Thread(target=self._loop, name='fila-historico', daemon=True).start()
+        atexit.register(self._drenar_com_log)
+
+    def _loop(self):
+        while True:
+            self._drenar_com_log(bloquear=False)
+            time.sleep(self.intervalo)
+
+    def _drenar_com_log(self, bloquear=True):
+        try:
+            return self.drenar(bloquear=bloquear)
+        except Exception:
+            # As linhas continuam na fila e serão regravadas na próxima descarga
+            logger.exception('Falha ao descarregar a fila de histórico')
+            return 0
@@ -0,0 +1,39 @@
+import os
+
+# Carrega o app uma única vez no master e compartilha as páginas via fork
+# (copy-on-write); o pool de conexões herdado é descartado em post_fork.
+preload_app = True
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+bind = "0.0.0.0:" + os.getenv("PORT", "8000")
+
+
+def post_fork(server, worker):
+    # Com preload o engine foi criado no master: o worker descarta o pool herdado
+    # para que nenhum socket de conexão seja compartilhado entre processos.
+    if not server.cfg.preload_app:
+        return
+
+    from Inventario import db
+
+    app = worker.app.wsgi()
+    app = getattr(app, 'flask_app', app)  # api_async.ApiAsync embrulha o app Flask
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Descarga do histórico write-behind: começa no worker (nunca no master, nem
+    # em comandos flask) e já grava o que ficou na fila de uma execução anterior.
+    app = worker.wsgi
+    app = getattr(app, 'flask_app', app)
+    fila = app.extensions.get('fila_historico')
+    if fila:
+        fila.iniciar()
+
+
+def worker_exit(server, worker):
+    # Registra as métricas do pool do worker que está saindo (ver /metricas/pool).
+    from metricas_pool import snapshot
+
+    server.log.info("metricas do pool: %s", snapshot())
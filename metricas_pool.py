@@ -0,0 +1,175 @@
+"""Configuração dos pools de conexões via ambiente e métricas por worker.
+
+Variáveis de ambiente (valores padrão entre parênteses):
+
+    DB_POOL_SIZE (5)         conexões mantidas abertas por worker
+    DB_MAX_OVERFLOW (10)     conexões extras permitidas em picos
+    DB_POOL_TIMEOUT (30)     segundos aguardando uma conexão livre
+    DB_POOL_RECYCLE (300)    idade máxima de uma conexão, em segundos
+    DB_POOL_PRE_PING (1)     testa a conexão a cada checkout (custa um round-trip)
+    DB_PGBOUNCER (0)         usa NullPool: o pooling fica a cargo do PgBouncer
+                             em modo transaction
+
+O engine assíncrono de api_async tem um pool próprio, configurado pelas mesmas
+variáveis com prefixo DB_ASYNC_ (DB_ASYNC_POOL_SIZE (5), DB_ASYNC_MAX_OVERFLOW
+(5), DB_ASYNC_POOL_TIMEOUT, DB_ASYNC_POOL_RECYCLE, DB_ASYNC_POOL_PRE_PING).
+
+Com N workers o total de conexões é
+N * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW)
+no processo ASGI; os números de /metricas/pool ajudam a dimensionar esses
+valores.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+
+
+def _env_int(nome, padrao):
+    return int(os.getenv(nome, padrao))
+
+
+def _env_bool(nome, padrao):
+    return os.getenv(nome, padrao).strip().lower() in ('1', 'true', 'yes', 'on', 'sim')
+
+
+class MetricasPool:
+    """Contadores de um pool de conexões no processo atual (um por worker)."""
+
+    def __init__(self, amostras=1000):
+        self._amostras = amostras
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._lock = threading.Lock()
+        self._esperas = deque(maxlen=self._amostras)
+        self.checkouts = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.em_uso = 0
+        self.em_uso_max = 0
+        self.overflow_eventos = 0
+        self.timeouts = 0
+
+    def registrar_espera(self, espera):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self._esperas.append(espera)
+
+    def registrar_checkout(self, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.em_uso += 1
+            self.em_uso_max = max(self.em_uso_max, self.em_uso)
+            if overflow:
+                self.overflow_eventos += 1
+
+    def registrar_checkin(self):
+        with self._lock:
+            self.em_uso = max(self.em_uso - 1, 0)
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            esperas = sorted(self._esperas)
+
+            def percentil(p):
+                if not esperas:
+                    return 0.0
+                return esperas[min(int(len(esperas) * p), len(esperas) - 1)] * 1000
+
+            return {
+                'checkouts': self.checkouts,
+                # Média sobre todas as esperas; os percentis usam só as últimas amostras
+                'espera_media_ms': (self.espera_total / self.esperas * 1000) if self.esperas else 0.0,
+                'espera_p50_ms': percentil(0.50),
+                'espera_p95_ms': percentil(0.95),
+                'espera_max_ms': self.espera_max * 1000,
+                'em_uso': self.em_uso,
+                'em_uso_max': self.em_uso_max,
+                'overflow_eventos': self.overflow_eventos,
+                'timeouts': self.timeouts,
+            }
+
+
+# Um conjunto de métricas por pool: 'sync' (Flask-SQLAlchemy) e 'async' (api_async)
+metricas = {'sync': MetricasPool(), 'async': MetricasPool()}
+
+
+def _reiniciar_metricas():
+    # Cada worker do gunicorn começa com contadores zerados após o fork.
+    for m in metricas.values():
+        m.reiniciar()
+
+
+os.register_at_fork(after_in_child=_reiniciar_metricas)
+
+
+def snapshot():
+    return {'pid': os.getpid(), **{nome: m.snapshot() for nome, m in metricas.items()}}
+
+
+def instrumentar(engine, nome):
+    """Liga as métricas `metricas[nome]` ao pool de `engine` (sync ou async).
+
+    Conexões em uso e overflow vêm dos eventos checkout/checkin do pool, que
+    sobrevivem a engine.dispose(). O SQLAlchemy não tem evento antes do
+    checkout, então a espera (fila do pool + pre-ping + conexão nova) e os
+    timeouts são medidos em volta de raw_connection(), por onde toda conexão
+    do engine passa.
+    """
+    m = metricas[nome]
+    engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(engine, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool = engine.pool
+        overflow = hasattr(pool, 'checkedout') and pool.checkedout() > pool.size()
+        m.registrar_checkout(overflow)
+
+    @event.listens_for(engine, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        m.registrar_checkin()
+
+    raw_connection = engine.raw_connection
+
+    def raw_connection_medido():
+        inicio = time.perf_counter()
+        try:
+            return raw_connection()
+        except PoolTimeoutError:
+            m.registrar_timeout()
+            raise
+        finally:
+            m.registrar_espera(time.perf_counter() - inicio)
+
+    engine.raw_connection = raw_connection_medido
+
+
+def engine_options(prefixo='DB', pool_size='5', max_overflow='10'):
+    """Monta as opções do engine a partir das variáveis `<prefixo>_*`."""
+    if _env_bool('DB_PGBOUNCER', '0'):
+        # Cada checkout abre (e cada checkin fecha) uma conexão com o PgBouncer,
+        # que mantém o pool real de conexões com o Postgres.
+        return {
+            'poolclass': NullPool,
+            'pool_pre_ping': False,
+        }
+
+    return {
+        'pool_pre_ping': _env_bool(f'{prefixo}_POOL_PRE_PING', '1'),
+        'pool_recycle': _env_int(f'{prefixo}_POOL_RECYCLE', '300'),
+        'pool_size': _env_int(f'{prefixo}_POOL_SIZE', pool_size),
+        'max_overflow': _env_int(f'{prefixo}_MAX_OVERFLOW', max_overflow),
+        'pool_timeout': _env_int(f'{prefixo}_POOL_TIMEOUT', '30'),
+    }
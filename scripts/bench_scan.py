@@ -0,0 +1,118 @@
+"""Compara a leitura de cartões no caminho síncrono e na API assíncrona.
+
+Simula N coletores simultâneos (padrão: 200), cada um fazendo leituras em
+sequência, e mede vazão e latência de:
+
+    sync   POST /inventario (acao=registrar)   gunicorn, workers sync
+    async  POST /api/registrar                 gunicorn + UvicornWorker
+
+Os dois servidores devem apontar para o mesmo banco, por exemplo:
+
+    gunicorn -w 2 -b :8000 "Inventario:create_app()"
+    gunicorn -w 2 -b :8001 -k uvicorn_worker.UvicornWorker "api_async:create_asgi_app()"
+    python scripts/bench_scan.py --url-sync http://localhost:8000 --url-async http://localhost:8001 --preparar
+
+--preparar inicia um inventário e cadastra os cartões BENCH-0000..N na planta
+do usuário (use só uma vez por banco). Requer httpx (pip install httpx).
+
+Cada coletor tem seu próprio cliente (conexões próprias) e envia sempre o cookie
+obtido no login, ignorando o Set-Cookie das respostas: no caminho sync cada
+leitura grava um flash na sessão, e acumular esses flashes no cookie inflaria
+as requisições seguintes.
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import random
+import statistics
+import time
+
+import httpx
+
+
+async def login(cliente, args):
+    resposta = await cliente.post('/login', data={'nome': args.usuario, 'senha': args.senha, 'planta': args.planta})
+    if resposta.status_code != 302:
+        raise SystemExit(f'Falha no login em {cliente.base_url}: HTTP {resposta.status_code}')
+    return resposta.headers['set-cookie'].split(';', 1)[0]
+
+
+def cliente_sem_cookies(url, cookie, args):
+    # Jar que recusa todo Set-Cookie: a sessão enviada é sempre a do login
+    jar = http.cookiejar.CookieJar(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return httpx.AsyncClient(base_url=url, cookies=jar, headers={'Cookie': cookie}, timeout=args.timeout)
+
+
+async def preparar(args):
+    async with httpx.AsyncClient(base_url=args.url_sync) as cliente:
+        await login(cliente, args)
+        numeros = '\n'.join(f'BENCH-{i:04d}' for i in range(args.cartoes))
+        await cliente.post('/cadastro-cartoes', data={'planta': args.planta, 'lista_cartoes': numeros})
+        await cliente.post('/inventario', data={'acao': 'iniciar'})
+
+
+async def coletor(url, cookie, caminho, args, latencias, erros):
+    async with cliente_sem_cookies(url, cookie, args) as cliente:
+        for _ in range(args.leituras):
+            numero = f'BENCH-{random.randrange(args.cartoes):04d}'
+            inicio = time.perf_counter()
+            try:
+                if caminho == 'sync':
+                    resposta = await cliente.post('/inventario', data={'acao': 'registrar', 'numero': numero})
+                    ok = resposta.status_code == 302
+                else:
+                    resposta = await cliente.post('/api/registrar', json={'numero': numero})
+                    ok = resposta.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencias.append(time.perf_counter() - inicio)
+            if not ok:
+                erros.append(numero)
+
+
+async def rodar(caminho, url, args):
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as cliente:
+        cookie = await login(cliente, args)
+
+    latencias, erros = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        coletor(url, cookie, caminho, args, latencias, erros)
+        for _ in range(args.coletores)
+    ])
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[min(int(len(latencias) * 0.95), len(latencias) - 1)]
+    print(
+        f"{caminho:5} {len(latencias)} leituras em {duracao:6.2f}s"
+        f" | {len(latencias) / duracao:7.1f} leituras/s"
+        f" | p50 {statistics.median(latencias) * 1000:7.1f} ms"
+        f" | p95 {p95 * 1000:7.1f} ms"
+        f" | erros {len(erros)}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url-sync', default='http://localhost:8000')
+    parser.add_argument('--url-async', default='http://localhost:8001')
+    parser.add_argument('--usuario', default='admin')
+    parser.add_argument('--senha', default='admin123')
+    parser.add_argument('--planta', default='1412')
+    parser.add_argument('--coletores', type=int, default=200)
+    parser.add_argument('--leituras', type=int, default=20, help='leituras por coletor')
+    parser.add_argument('--cartoes', type=int, default=2000)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--preparar', action='store_true')
+    args = parser.parse_args()
+
+    if args.preparar:
+        await preparar(args)
+
+    await rodar('sync', args.url_sync, args)
+    await rodar('async', args.url_async, args)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
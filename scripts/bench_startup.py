@@ -0,0 +1,95 @@
+"""Mede o custo de boot de um worker: tempo de import/criação do app e RSS.
+
+Cada medição roda em um processo Python novo, como um worker recém-iniciado.
+
+    antes   o Inventario.py de uma revisão anterior do git (--antes-ref), em que
+            app, db e engine são criados e o pandas é importado no carregamento
+            do módulo
+    depois  o Inventario.py atual: import + create_app(), pandas sob demanda
+
+Sem --antes-ref o modo "antes" é apenas simulado (layout atual + import pandas)
+e aparece assim identificado na saída.
+
+Uso:
+    python scripts/bench_startup.py [--repeticoes 5] [--antes-ref <revisão>]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+if {importar_pandas!r}:
+    import pandas
+import Inventario
+if {chamar_factory!r}:
+    app = Inventario.create_app()
+fim = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "segundos": fim - inicio,
+    "rss_mb": rss_kb / 1024,
+    "pandas": "pandas" in sys.modules,
+}}))
+"""
+
+
+def medir(diretorio, importar_pandas, chamar_factory):
+    env = dict(os.environ)
+    # O app exige uma URL de banco; o engine é criado mas nenhuma conexão é
+    # aberta durante o boot.
+    env.setdefault("DATABASE_URL", "postgresql+psycopg2://bench@localhost/bench")
+    env["PYTHONPATH"] = os.pathsep.join([diretorio, RAIZ])
+    codigo = CODIGO.format(importar_pandas=importar_pandas, chamar_factory=chamar_factory)
+    saida = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=diretorio, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def cenarios(args, diretorio_antes):
+    if diretorio_antes:
+        yield f"antes ({args.antes_ref})", diretorio_antes, False, False
+    else:
+        yield "antes (simulado: atual + pandas)", RAIZ, True, True
+    yield "depois (create_app lazy)", RAIZ, False, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--antes-ref", help="revisão do git com o Inventario.py anterior à factory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporario:
+        diretorio_antes = None
+        if args.antes_ref:
+            fonte = subprocess.run(
+                ["git", "show", f"{args.antes_ref}:Inventario.py"],
+                cwd=RAIZ, capture_output=True, text=True, check=True
+            ).stdout
+            with open(os.path.join(temporario, "Inventario.py"), "w") as f:
+                f.write(fonte)
+            diretorio_antes = temporario
+
+        for nome, diretorio, importar_pandas, chamar_factory in cenarios(args, diretorio_antes):
+            amostras = [medir(diretorio, importar_pandas, chamar_factory) for _ in range(args.repeticoes)]
+            tempos = [a["segundos"] * 1000 for a in amostras]
+            rss = [a["rss_mb"] for a in amostras]
+            print(
+                f"{nome:34} boot: mediana {statistics.median(tempos):7.1f} ms"
+                f"  | RSS: mediana {statistics.median(rss):6.1f} MB"
+                f"  | pandas carregado: {amostras[0]['pandas']}"
+            )
+
+
+if __name__ == '__main__':
+    main()
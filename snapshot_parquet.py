@@ -0,0 +1,278 @@
+"""Snapshot colunar (Parquet) do historico_inventario para consultas analíticas.
+
+Os arquivos ficam particionados no estilo Hive:
+
+    <PARQUET_DIR>/historico/planta=1412/mes=2025-01/part-<id_min>-<id_max>.parquet
+
+A exportação é incremental a partir de uma marca d'água (_watermark.json) com o
+maior id exportado. O Postgres atribui o id no INSERT, não no commit: uma
+transação com id menor pode ser confirmada depois que a marca já passou por
+ele. Por isso cada execução relê uma janela de JANELA_IDS ids abaixo da marca e
+exporta só os ids dessa janela que ainda não foram exportados (a lista fica no
+próprio _watermark.json). Linhas confirmadas com mais de JANELA_IDS ids de
+atraso não são exportadas.
+
+A marca só avança depois que todos os arquivos do lote foram gravados; se o
+processo cair no meio, o lote é exportado de novo e a leitura descarta ids
+duplicados.
+
+Linhas alteradas depois de exportadas (hoje, só o "Não encontrado" que vira OK
+quando chega uma leitura atrasada da fila write-behind) têm alterado_em
+preenchido. Cada execução regrava a partição inteira dessas linhas a partir do
+banco, para alterações desde a execução anterior (menos MARGEM_ALTERACOES, para
+transações confirmadas com atraso e diferenças de relógio entre máquinas).
+
+Cada execução grava um arquivo pequeno por partição alterada. Quando uma
+partição acumula MAX_ARQUIVOS_PARTICAO arquivos, eles são compactados em um só
+(ids duplicados são descartados), limitando o número de arquivos lidos por
+/historico/analytics.
+
+Exclusões feitas no banco (ex.: exclusão de cartão com seu histórico) não são
+propagadas para o snapshot, a não ser que a partição seja regravada por conter
+uma linha alterada.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+JANELA_IDS = 10000
+MAX_ARQUIVOS_PARTICAO = 8
+MARGEM_ALTERACOES = timedelta(minutes=5)
+
+COLUNAS = ['id', 'cartao_id', 'numero', 'status', 'usuario', 'data', 'mes', 'inventario_id', 'planta']
+STATUS_NAO_ENCONTRADO = ['Não encontrado', 'Cartão não localizado no dia']
+
+
+def diretorio_historico(base):
+    return os.path.join(base, 'historico')
+
+
+def ler_watermark(base):
+    """Retorna (maior id exportado, ids exportados dentro da janela de releitura,
+    início da última busca por linhas alteradas ou None)."""
+    caminho = os.path.join(diretorio_historico(base), '_watermark.json')
+    if not os.path.exists(caminho):
+        return 0, set(), None
+    with open(caminho) as f:
+        dados = json.load(f)
+    alteracoes = dados.get('alteracoes')
+    return (
+        int(dados['ultimo_id']),
+        set(dados.get('recentes', [])),
+        datetime.fromisoformat(alteracoes) if alteracoes else None,
+    )
+
+
+def gravar_watermark(base, ultimo_id, recentes, alteracoes=None):
+    destino = diretorio_historico(base)
+    os.makedirs(destino, exist_ok=True)
+    caminho = os.path.join(destino, '_watermark.json')
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump({
+            'ultimo_id': ultimo_id,
+            'recentes': sorted(recentes),
+            'alteracoes': alteracoes.isoformat() if alteracoes else None,
+        }, f)
+    os.replace(temporario, caminho)
+
+
+def destino_particao(base, planta, mes):
+    return os.path.join(diretorio_historico(base), f'planta={planta}', f'mes={mes}')
+
+
+def exportar_incremental(session, modelo, base, lote=50000, janela=JANELA_IDS):
+    """Exporta para Parquet as linhas de `modelo` ainda não exportadas.
+
+    Retorna a quantidade de linhas exportadas.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    watermark, recentes, alteracoes = ler_watermark(base)
+    inicio_alteracoes = datetime.now(timezone.utc).replace(tzinfo=None)
+    cursor = max(watermark - janela, 0)
+    total = 0
+    particoes = set()
+
+    while True:
+        linhas = (
+            session.query(*[getattr(modelo, c) for c in COLUNAS])
+            .filter(modelo.id > cursor)
+            .order_by(modelo.id)
+            .limit(lote)
+            .all()
+        )
+        if not linhas:
+            break
+        cursor = linhas[-1][0]
+
+        df = pd.DataFrame.from_records(linhas, columns=COLUNAS)
+        df = df[~df['id'].isin(recentes)]
+
+        if not df.empty:
+            df['planta'] = df['planta'].fillna('sem_planta')
+            df['mes'] = df['mes'].fillna('sem_mes')
+
+            for (planta, mes), grupo in df.groupby(['planta', 'mes'], sort=False):
+                destino = destino_particao(base, planta, mes)
+                os.makedirs(destino, exist_ok=True)
+                nome = f"part-{grupo['id'].min()}-{grupo['id'].max()}.parquet"
+                tabela = pa.Table.from_pandas(grupo.drop(columns=['planta', 'mes']), preserve_index=False)
+                pq.write_table(tabela, os.path.join(destino, nome))
+                particoes.add(destino)
+
+            watermark = max(watermark, int(df['id'].max()))
+            recentes = {i for i in recentes | set(df['id'].tolist()) if i > watermark - janela}
+            gravar_watermark(base, watermark, recentes, alteracoes)
+            total += len(df)
+
+        if len(linhas) < lote:
+            break
+
+    # Partições com linhas alteradas são regravadas inteiras (e não precisam de compactação)
+    consulta = session.query(modelo.planta, modelo.mes).filter(modelo.alterado_em.isnot(None))
+    if alteracoes is not None:
+        consulta = consulta.filter(modelo.alterado_em >= alteracoes - MARGEM_ALTERACOES)
+    for planta, mes in consulta.distinct().all():
+        ids = regravar_particao(session, modelo, base, planta, mes, watermark)
+        recentes |= {i for i in ids if i > watermark - janela}
+        particoes.discard(destino_particao(base, planta or 'sem_planta', mes or 'sem_mes'))
+    gravar_watermark(base, watermark, recentes, inicio_alteracoes)
+
+    for destino in particoes:
+        compactar_particao(destino)
+
+    return total
+
+
+def regravar_particao(session, modelo, base, planta, mes, ate_id):
+    """Substitui os arquivos de (planta, mes) pelas linhas atuais do banco com id <= ate_id.
+
+    Retorna os ids gravados.
+    """
+    import pandas as pd
+
+    filtros = [
+        modelo.planta.is_(None) if planta is None else modelo.planta == planta,
+        modelo.mes.is_(None) if mes is None else modelo.mes == mes,
+        modelo.id <= ate_id,
+    ]
+    linhas = (
+        session.query(*[getattr(modelo, c) for c in COLUNAS if c not in ('planta', 'mes')])
+        .filter(*filtros)
+        .order_by(modelo.id)
+        .all()
+    )
+    destino = destino_particao(base, planta or 'sem_planta', mes or 'sem_mes')
+    if not linhas or not os.path.isdir(destino):
+        # Partição ainda não exportada: a exportação incremental cuida dela
+        return []
+
+    df = pd.DataFrame.from_records(linhas, columns=[c for c in COLUNAS if c not in ('planta', 'mes')])
+    substituir_arquivos(destino, df)
+    return df['id'].tolist()
+
+
+def compactar_particao(destino, max_arquivos=MAX_ARQUIVOS_PARTICAO):
+    """Junta os arquivos da partição em um só quando chegam a `max_arquivos`."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    arquivos = sorted(a for a in os.listdir(destino) if a.startswith('part-') and a.endswith('.parquet'))
+    if len(arquivos) < max_arquivos:
+        return
+
+    df = pd.concat([pq.read_table(os.path.join(destino, a)).to_pandas() for a in arquivos], ignore_index=True)
+    substituir_arquivos(destino, df.drop_duplicates(subset='id').sort_values('id'))
+
+
+def substituir_arquivos(destino, df):
+    """Grava `df` em um único arquivo da partição e remove os demais."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arquivos = [a for a in os.listdir(destino) if a.startswith('part-') and a.endswith('.parquet')]
+    nome = f"part-{df['id'].min()}-{df['id'].max()}.parquet"
+    # O arquivo novo entra antes de os antigos saírem; nesse intervalo a leitura
+    # vê ids repetidos, que carregar() descarta.
+    temporario = os.path.join(destino, '.' + nome + '.tmp')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporario)
+    os.replace(temporario, os.path.join(destino, nome))
+    for arquivo in arquivos:
+        if arquivo != nome:
+            os.remove(os.path.join(destino, arquivo))
+
+
+def carregar(base, planta=None, mes=None):
+    """Lê o snapshot como DataFrame, aplicando filtros pelas partições."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    destino = diretorio_historico(base)
+    if not os.path.isdir(destino):
+        return pd.DataFrame(columns=COLUNAS)
+
+    # Esquema explícito: sem ele a planta "1412" seria inferida como inteiro.
+    particoes = ds.partitioning(pa.schema([('planta', pa.string()), ('mes', pa.string())]), flavor='hive')
+    dataset = ds.dataset(destino, format='parquet', partitioning=particoes)
+    filtro = None
+    if planta:
+        filtro = ds.field('planta') == str(planta)
+    if mes:
+        condicao = ds.field('mes') == str(mes)
+        filtro = condicao if filtro is None else filtro & condicao
+
+    try:
+        df = dataset.to_table(filter=filtro).to_pandas()
+    except FileNotFoundError:
+        # Uma compactação removeu arquivos depois da listagem: lista de novo
+        return carregar(base, planta=planta, mes=mes)
+    return df.drop_duplicates(subset='id')
+
+
+def agregados(df):
+    """Resumo por planta/mês no formato do dashboard (OK x não encontrado)."""
+    if df.empty:
+        return []
+
+    df = df.assign(
+        ok=(df['status'] == 'OK').astype('int64'),
+        nao=df['status'].isin(STATUS_NAO_ENCONTRADO).astype('int64'),
+    )
+    resumo = (
+        df.groupby(['planta', 'mes'], observed=True)
+        .agg(
+            ok=('ok', 'sum'),
+            nao=('nao', 'sum'),
+            total=('id', 'size'),
+            cartoes=('cartao_id', 'nunique'),
+            inventarios=('inventario_id', 'nunique'),
+        )
+        .reset_index()
+        .sort_values(['mes', 'planta'])
+    )
+    resumo['planta'] = resumo['planta'].astype(str)
+    resumo['mes'] = resumo['mes'].astype(str)
+    return [
+        {k: (int(v) if k not in ('planta', 'mes') else v) for k, v in linha.items()}
+        for linha in resumo.to_dict(orient='records')
+    ]
+
+
+def exportar_periodicamente(exportar, intervalo):
+    """Executa `exportar()` a cada `intervalo` segundos (modo agendado)."""
+    while True:
+        inicio = time.monotonic()
+        try:
+            exportar()
+        except Exception:
+            # Falhas transitórias (banco, disco) não encerram o modo agendado
+            logger.exception('Falha na exportação para Parquet; nova tentativa em %ss', intervalo)
+        time.sleep(max(intervalo - (time.monotonic() - inicio), 0))